@@ -1,246 +1,304 @@
 import os
 import sys
+import shutil
+import subprocess
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, Any
+import logging.handlers
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from airflow import DAG
 from airflow.operators.python import PythonOperator
-from airflow.operators.bash import BashOperator
-from airflow.providers.postgres.operators.postgres import PostgresOperator
-from airflow.providers.postgres.hooks.postgres import PostgresHook
-from airflow.exceptions import AirflowException
-from airflow.utils.dates import days_ago
-from dotenv import load_dotenv
-
-# Add project root to Python path
-sys.path.append('/opt/airflow')
-sys.path.append('/opt/airflow/src')
-sys.path.append('/opt/airflow/config')
-
-load_dotenv(dotenv_path="/opt/airflow/.env") 
-
-SCRIPT_PATHS = {
-    'data_generator': os.getenv('DATA_GENERATOR_SCRIPT'),
-    'quality_checker': os.getenv('QUALITY_CHECKER_SCRIPT'),
-    'data_uploader': os.getenv('DATA_UPLOADER_SCRIPT'),
-    'monitoring_audit': os.getenv('MONITORING_AUDIT_SCRIPT'),
-}
+from airflow.exceptions import AirflowException, AirflowTaskTimeout
+
+# Dữ liệu trung gian giữa các task nằm trên tmpfs (RAM), không ghi xuống đĩa
+GENERATED_DATA_DIR = "/dev/shm/generated_data"
+# Số bản ghi log giữ trong bộ nhớ trước khi ghi ra file
+LOG_BUFFER_CAPACITY = 100
+TASK_LOG_FORMATTER = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+# Số dòng output cuối cùng của subprocess đưa vào thông báo lỗi
+OUTPUT_TAIL_LINES = 50
+# Thư mục run trên tmpfs cũ hơn mốc này bị xoá khi bắt đầu run mới
+STALE_RUN_DATA_MAX_AGE = timedelta(days=1)
+
+@lru_cache(maxsize=1)
+def load_pipeline_env():
+    """Load /opt/airflow/.env once per worker process and return the script paths"""
+    from dotenv import load_dotenv
+
+    load_dotenv(dotenv_path="/opt/airflow/.env")
+    return {
+        'monitoring_audit': os.getenv('MONITORING_AUDIT_SCRIPT'),
+    }
+
+def run_output_dir(run_id):
+    """Return the data directory for a DAG run (same path in every task, no XCom needed)"""
+    return os.path.join(GENERATED_DATA_DIR, f"run_{run_id.replace(':', '_')}")
+
+def remove_stale_run_dirs(max_age=STALE_RUN_DATA_MAX_AGE):
+    """Remove run directories left on tmpfs by runs that never reached cleanup"""
+    cutoff = datetime.now().timestamp() - max_age.total_seconds()
+    removed = []
+    if not os.path.isdir(GENERATED_DATA_DIR):
+        return removed
+    with os.scandir(GENERATED_DATA_DIR) as entries:
+        for entry in entries:
+            if entry.name.startswith('run_') and entry.is_dir() and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed.append(entry.path)
+    return removed
+
+def task_log_path(run_id, task_id):
+    """Return the log file path for a task in a run, creating its directory"""
+    log_dir = f"/opt/airflow/logs/run_{run_id.replace(':', '_')}"
+    os.makedirs(log_dir, exist_ok=True)
+    return f"{log_dir}/{task_id}.log"
 
 def setup_task_logger(run_id, task_id):
     """Setup logger for specific task and run"""
-    log_dir = f"/opt/airflow/logs/run_{run_id.replace(':', '_')}"
-    os.makedirs(log_dir, exist_ok=True)
-    
     logger = logging.getLogger(f"{run_id}_{task_id}")
     logger.setLevel(logging.INFO)
     
     # Remove existing handlers
     logger.handlers.clear()
     
-    # File handler
-    handler = logging.FileHandler(f"{log_dir}/{task_id}.log")
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
+    # File handler, buffered so records are written in batches (errors flush immediately)
+    file_handler = logging.FileHandler(task_log_path(run_id, task_id))
+    file_handler.setFormatter(TASK_LOG_FORMATTER)
+    handler = logging.handlers.MemoryHandler(
+        LOG_BUFFER_CAPACITY, flushLevel=logging.ERROR, target=file_handler)
     logger.addHandler(handler)
     
     return logger
 
+def close_task_logger(logger):
+    """Flush buffered records and close the task log file"""
+    for handler in list(logger.handlers):
+        target = getattr(handler, 'target', None)
+        handler.close()
+        if target:
+            target.close()
+        logger.removeHandler(handler)
+
+def read_log_tail(path, offset, max_lines):
+    """Return the last max_lines lines written to path after offset"""
+    with open(path, 'r', errors='replace') as f:
+        f.seek(offset)
+        return [line.rstrip() for line in deque(f, maxlen=max_lines)]
+
 # DAG default arguments
 default_args = {
     'owner': 'data_engineering_team',
     'depends_on_past': False,
-    'start_date': days_ago(1),
+    'start_date': datetime(2024, 1, 1, tzinfo=timezone.utc),
     'email_on_failure': True,
     'email_on_retry': False,
     'retries': 2,
     'retry_delay': timedelta(minutes=2),
     'catchup': False,
+    # Giá trị return của các callable không được task nào đọc - không ghi vào XCom
+    'do_xcom_push': False,
 }
 
 def generate_banking_data(**context):
     """Generate synthetic banking data and return output directory"""
-    import subprocess
-    import os
-    from datetime import datetime
+    import generate_data as data_generator
 
     task_id = context['task_instance'].task_id
     run_id = context['run_id']
     logger = setup_task_logger(run_id, task_id)
+    load_pipeline_env()
 
     try:
-        logger.info(f"Starting data generation for run {run_id}")
+        logger.info("Starting data generation for run %s", run_id)
 
-        base_dir = "/tmp/generated_data"
-        os.makedirs(base_dir, exist_ok=True)
-        output_dir = os.path.join(base_dir, f"run_{run_id.replace(':', '_')}")
+        # Run lỗi/timeout không đi qua cleanup_and_notify - dọn để tmpfs không đầy dần
+        for stale_dir in remove_stale_run_dirs():
+            logger.info("Removed stale run data directory %s", stale_dir)
+
+        output_dir = run_output_dir(run_id)
         os.makedirs(output_dir, exist_ok=True)
-        # Set environment variables
-        env = os.environ.copy()
-
-        result = subprocess.run(
-            ['python', SCRIPT_PATHS['data_generator'], '--output_dir', output_dir],
-            capture_output=True,
-            text=True,
-            env=env,
-            timeout=1800
-        )
+        customer_count = int(os.getenv('CUSTOMER_COUNT', '10'))
 
-        logger.info(f"Data generation output: {result.stdout}")
-
-        if result.returncode != 0:
-            error_msg = f"Data generation failed: {result.stderr}"
-            logger.error(error_msg)
-            raise AirflowException(error_msg)
+        record_counts = data_generator.run(output_dir, customer_count)
 
+        logger.info("Data generation output: %s", record_counts)
         logger.info("Task completed successfully")
 
-        ti = context['task_instance']
-        ti.xcom_push(key='data_output_path', value=output_dir)
-
         return {"status": "success", "path": output_dir}
 
-    except subprocess.TimeoutExpired:
+    except AirflowTaskTimeout:
         error_msg = "Data generation timed out after 30 minutes"
         logger.error(error_msg)
-        raise AirflowException(error_msg)
+        raise
     except Exception as e:
         error_msg = f"Unexpected error in data generation: {str(e)}"
-        logger.error(f"{error_msg} - {str(e)}")
-        raise
+        logger.error("%s - %s", error_msg, e)
+        raise AirflowException(error_msg) from e
+    finally:
+        close_task_logger(logger)
+
+
+def init_database_schema(**context):
+    """Create the pipeline tables in the data warehouse"""
+    import data_uploader
+
+    task_id = context['task_instance'].task_id
+    run_id = context['run_id']
+    logger = setup_task_logger(run_id, task_id)
+    load_pipeline_env()
 
+    try:
+        logger.info("Initializing database schema for run %s", run_id)
+        data_uploader.init_schema()
+        logger.info("Task completed successfully")
+
+        return {"status": "success", "message": "Schema initialized"}
+
+    except AirflowTaskTimeout:
+        logger.error("Schema initialization timed out after 5 minutes")
+        raise
+    except Exception as e:
+        error_msg = f"Schema initialization failed: {str(e)}"
+        logger.error(error_msg)
+        raise AirflowException(error_msg) from e
+    finally:
+        close_task_logger(logger)
 
 def run_data_quality_checks(**context):
     """Run comprehensive data quality checks using generated output"""
-    import subprocess
+    import data_quality
 
     task_id = context['task_instance'].task_id
     run_id = context['run_id']
     logger = setup_task_logger(run_id, task_id)
+    load_pipeline_env()
 
     try:
-        logger.info(f"Starting data quality checks for run {run_id}")
+        logger.info("Starting data quality checks for run %s", run_id)
 
-        # Lấy path từ XCom
         ti = context['ti']
-        data_path = ti.xcom_pull(task_ids='generate_banking_data', key='data_output_path')
-        if not data_path:
-            raise AirflowException("No data path found from previous task.")
-
-        # Truyền path vào script kiểm tra
-        result = subprocess.run(
-            ['python', SCRIPT_PATHS['quality_checker'], '--input_dir', data_path],
-            capture_output=True,
-            text=True,
-            timeout=600
-        )
-
-        if result.returncode != 0:
-            error_msg = f"Data quality check failed: {result.stderr}"
+        data_path = run_output_dir(run_id)
+        if not os.path.isdir(data_path):
+            raise AirflowException(f"No data found from previous task at {data_path}")
+
+        try:
+            issues = data_quality.run(data_path)
+        except AirflowTaskTimeout:
+            raise
+        except Exception as e:
+            error_msg = f"Data quality check failed: {str(e)}"
             logger.error(error_msg)
             ti.xcom_push(key='quality_check_failed', value=True)
-            ti.xcom_push(key='quality_error_details', value=result.stderr)
-            raise AirflowException(error_msg)
+            ti.xcom_push(key='quality_error_details', value=str(e))
+            raise AirflowException(error_msg) from e
 
-        logger.info(f"Data quality checks passed: {result.stdout}")
+        logger.info("Data quality checks passed: %s issues found", len(issues))
         logger.info("Task completed successfully")
         ti.xcom_push(key='quality_check_failed', value=False)
 
         return {"status": "success", "message": "Data quality checks passed"}
 
-    except subprocess.TimeoutExpired:
+    except AirflowTaskTimeout:
         error_msg = "Data quality check timed out after 10 minutes"
         logger.error(error_msg)
-        raise AirflowException(error_msg)
+        raise
     except Exception as e:
         error_msg = f"Unexpected error in quality checks: {str(e)}"
-        logger.error(f"{error_msg} - {str(e)}")
+        logger.error("%s - %s", error_msg, e)
         raise
+    finally:
+        close_task_logger(logger)
 
 def run_risk_alerts(**context):
     """Run risk alert checks using generated output"""
-    import subprocess
-
     task_id = context['task_instance'].task_id
     run_id = context['run_id']
     logger = setup_task_logger(run_id, task_id)
+    script_paths = load_pipeline_env()
 
     try:
-        logger.info(f"Starting risk alert checks for run {run_id}")
-
-        # Lấy path từ XCom
-        ti = context['ti']
-        data_path = ti.xcom_pull(task_ids='generate_banking_data', key='data_output_path')
-        if not data_path:
-            raise AirflowException("No data path found from previous task.")
-
-        # Truyền path vào script kiểm tra
-        result = subprocess.run(
-            ['python', SCRIPT_PATHS['monitoring_audit'], '--dir', data_path],
-            capture_output=True,
-            text=True,
-            timeout=600
-        )
-
-        if result.returncode != 0:
-            error_msg = f"Risk alert check failed: {result.stderr}"
+        logger.info("Starting risk alert checks for run %s", run_id)
+
+        data_path = run_output_dir(run_id)
+        if not os.path.isdir(data_path):
+            raise AirflowException(f"No data found from previous task at {data_path}")
+
+        # Flush log đang buffer để output của script nối tiếp đúng thứ tự trong file log
+        for handler in logger.handlers:
+            handler.flush()
+
+        # Truyền path vào script kiểm tra; stdout/stderr ghi thẳng vào file log của task
+        log_path = task_log_path(run_id, task_id)
+        with open(log_path, 'a') as child_log:
+            output_offset = child_log.tell()
+            process = subprocess.Popen(
+                [sys.executable, script_paths['monitoring_audit'], '--dir', data_path],
+                stdout=child_log,
+                stderr=subprocess.STDOUT
+            )
+        try:
+            returncode = process.wait()
+        except BaseException:
+            # Timeout, SIGTERM (dagrun_timeout, mark failed) hay lỗi khác - dừng script
+            # để không bỏ lại process mồ côi còn giữ connection DB
+            process.kill()
+            process.wait()
+            raise
+
+        if returncode != 0:
+            error_output = "\n".join(read_log_tail(log_path, output_offset, OUTPUT_TAIL_LINES))
+            error_msg = f"Risk alert check failed: {error_output}"
             logger.error(error_msg)
             raise AirflowException(error_msg)
 
-        logger.info(f"Risk alert checks passed: {result.stdout}")
+        logger.info("Risk alert checks passed")
         logger.info("Task completed successfully")
 
         return {"status": "success", "message": "Risk alert checks passed"}
 
-    except subprocess.TimeoutExpired:
+    except AirflowTaskTimeout:
         error_msg = "Risk alert check timed out after 10 minutes"
         logger.error(error_msg)
-        raise AirflowException(error_msg)
+        raise
     except Exception as e:
         error_msg = f"Unexpected error in risk alerts: {str(e)}"
-        logger.error(f"{error_msg} - {str(e)}")
+        logger.error("%s - %s", error_msg, e)
         raise
+    finally:
+        close_task_logger(logger)
 
 
 def upload_data_to_postgres(**context):
     """Upload validated data to PostgreSQL"""
-    import subprocess
-    
+    import data_uploader
+
     task_id = context['task_instance'].task_id
     run_id = context['run_id']
     logger = setup_task_logger(run_id, task_id)
+    load_pipeline_env()
     
     try:
-        logger.info(f"Starting data upload for run {run_id}")
+        logger.info("Starting data upload for run %s", run_id)
 
-        ti = context['ti']
-        dir = ti.xcom_pull(task_ids='generate_banking_data', key='data_output_path')
+        # Schema đã được tạo ở task init_database_schema
+        total_uploaded = data_uploader.run(run_output_dir(run_id), create_tables=False)
         
-        # Run data upload script
-        result = subprocess.run(
-            ['python', SCRIPT_PATHS['data_uploader'], '--dir', dir], 
-            capture_output=True, 
-            text=True,
-            timeout=1200  # 20 minutes timeout
-        )
-        
-        if result.returncode != 0:
-            error_msg = f"Data upload failed: {result.stderr}"
-            logger.error(error_msg)
-            raise AirflowException(error_msg)
-        
-        logger.info(f"Data upload completed successfully: {result.stdout}")
+        logger.info("Data upload completed successfully: %s records uploaded", total_uploaded)
         logger.info("Task completed successfully")
         
         return {"status": "success", "message": "Data uploaded successfully"}
         
-    except subprocess.TimeoutExpired:
+    except AirflowTaskTimeout:
         error_msg = "Data upload timed out after 20 minutes"
         logger.error(error_msg)
-        raise AirflowException(error_msg)
-    except Exception as e:
-        error_msg = f"Unexpected error in data upload: {str(e)}"
-        logger.error(f"{error_msg} - {str(e)}")
         raise
+    except Exception as e:
+        error_msg = f"Data upload failed: {str(e)}"
+        logger.error(error_msg)
+        raise AirflowException(error_msg) from e
+    finally:
+        close_task_logger(logger)
 
 def log_pipeline_failures(**context):
     """Log pipeline failure details"""
@@ -260,16 +318,26 @@ def log_pipeline_failures(**context):
                 task_ids='run_data_quality_checks', 
                 key='quality_error_details'
             )
-            logger.error(f"Quality check failures logged: {error_details}")
+            logger.error("Quality check failures logged: %s", error_details)
         
+        # Chuyển dữ liệu của run lỗi từ tmpfs sang thư mục log trên đĩa để kiểm tra sau
+        data_path = run_output_dir(run_id)
+        if os.path.isdir(data_path):
+            kept_path = os.path.join(os.path.dirname(task_log_path(run_id, task_id)), 'data')
+            shutil.copytree(data_path, kept_path, dirs_exist_ok=True)
+            shutil.rmtree(data_path, ignore_errors=True)
+            logger.info("Moved run data from %s to %s", data_path, kept_path)
+
         # Log general pipeline failure
         logger.error("Pipeline failed - check upstream task logs for details")
         
         print(f"Pipeline failure logged for run {run_id}")
         
     except Exception as e:
-        logger.error(f"Error logging pipeline failure: {str(e)}")
+        logger.error("Error logging pipeline failure: %s", e)
         print(f"Error logging pipeline failure: {str(e)}")
+    finally:
+        close_task_logger(logger)
 
 def notify(**context):
     """Send notifications"""
@@ -278,8 +346,13 @@ def notify(**context):
     logger = setup_task_logger(run_id, task_id)
     
     try:
+        # Giải phóng dữ liệu của run trên tmpfs
+        data_path = run_output_dir(run_id)
+        shutil.rmtree(data_path, ignore_errors=True)
+        logger.info("Removed run data directory %s", data_path)
+
         # Log successful completion
-        logger.info(f"Pipeline completed successfully for run {run_id}")
+        logger.info("Pipeline completed successfully for run %s", run_id)
         logger.info("Task completed successfully")
         
         # You can add notification logic here (email, Slack, etc.)
@@ -291,6 +364,8 @@ def notify(**context):
         error_msg = f"Error in cleanup: {str(e)}"
         logger.error(error_msg)
         print(f"Cleanup error: {error_msg}")
+    finally:
+        close_task_logger(logger)
 
 # Create the DAG
 dag = DAG(
@@ -299,6 +374,8 @@ dag = DAG(
     description='Banking Data Pipeline - Generate, Validate, and Upload Data',
     schedule_interval='@daily',
     max_active_runs=1,
+    max_active_tasks=3,
+    dagrun_timeout=timedelta(hours=2),
     catchup=False,
     tags=['banking', 'data-pipeline', 'etl'],
     doc_md=__doc__
@@ -308,14 +385,28 @@ dag = DAG(
 generate_data = PythonOperator(
     task_id='generate_banking_data',
     python_callable=generate_banking_data,
+    pool='bank_data_heavy',
+    priority_weight=10,  # Task dài nhất, ưu tiên lấy slot trước
+    execution_timeout=timedelta(minutes=30),
     dag=dag,
     doc_md="Generate synthetic banking data including customers, accounts, transactions"
 )
 
+# Task 1b: Create tables, runs in parallel with data generation
+init_schema = PythonOperator(
+    task_id='init_database_schema',
+    python_callable=init_database_schema,
+    execution_timeout=timedelta(minutes=5),
+    dag=dag,
+    doc_md="Create the warehouse tables if they do not exist"
+)
+
 # Task 2: Run data quality checks
 quality_checks = PythonOperator(
     task_id='run_data_quality_checks',
     python_callable=run_data_quality_checks,
+    pool='bank_data_validation',
+    execution_timeout=timedelta(minutes=10),
     dag=dag,
     doc_md="Run comprehensive data quality checks on generated data"
 )
@@ -324,6 +415,8 @@ quality_checks = PythonOperator(
 risk_alerts = PythonOperator(
     task_id='risk_alerts',
     python_callable=run_risk_alerts,
+    pool='bank_data_validation',
+    execution_timeout=timedelta(minutes=10),
     dag=dag,
     doc_md="Run risk alert checks on generated data"
 )
@@ -334,6 +427,8 @@ upload_data = PythonOperator(
     task_id='upload_data_to_postgres',
     python_callable=upload_data_to_postgres,
     trigger_rule='none_failed',  # Only run if quality checks pass
+    execution_timeout=timedelta(minutes=20),
+    sla=timedelta(hours=1),  # Dữ liệu phải vào DB trong vòng 1 giờ kể từ lịch chạy
     dag=dag,
     doc_md="Upload validated data to PostgreSQL database"
 )
@@ -357,7 +452,8 @@ cleanup_notify = PythonOperator(
 )
 
 # Define task dependencies
-generate_data >> quality_checks >> risk_alerts
+# Generation and schema setup are independent; quality checks query the tables so wait for both
+[generate_data, init_schema] >> quality_checks >> risk_alerts
 
 # Branching: If quality checks pass -> upload data, if fail -> log failures
 risk_alerts >> [upload_data, log_failures]
@@ -57,11 +57,17 @@ CREATE TABLE IF NOT EXISTS RiskAlerts (
 );
 
 -- Create indexes for performance
-CREATE INDEX IF NOT EXISTS idx_customers_cccd ON Customer(NationalID);
+-- Covering indexes: the quality checker's CustomerID/NationalID lookups become index-only scans
+DROP INDEX IF EXISTS idx_customers_cccd;
+CREATE INDEX IF NOT EXISTS idx_customers_id_cccd ON Customer(CustomerID) INCLUDE (NationalID);
+CREATE INDEX IF NOT EXISTS idx_customers_cccd_id ON Customer(NationalID) INCLUDE (CustomerID);
 CREATE INDEX IF NOT EXISTS idx_accounts_customer ON Account(CustomerID);
 CREATE INDEX IF NOT EXISTS idx_devices_customer ON Device(CustomerID);
 CREATE INDEX IF NOT EXISTS idx_auth_customer ON AuthenticationLog(CustomerID);
+CREATE INDEX IF NOT EXISTS idx_auth_device ON AuthenticationLog(DeviceID);
 CREATE INDEX IF NOT EXISTS idx_transactions_account ON Transaction(FromAccountID);
+CREATE INDEX IF NOT EXISTS idx_transactions_to_account ON Transaction(ToAccountID);
 CREATE INDEX IF NOT EXISTS idx_transactions_device ON Transaction(DeviceID);
 CREATE INDEX IF NOT EXISTS idx_transactions_time ON Transaction(Timestamp);
 CREATE INDEX IF NOT EXISTS idx_risk_alerts_customer ON RiskAlerts(CustomerID);
+CREATE INDEX IF NOT EXISTS idx_risk_alerts_transaction ON RiskAlerts(TransactionID);
@@ -1,27 +1,51 @@
 import sys
 import logging
-import json
+import orjson
 import argparse
 import os
-import psycopg2
 import re
-from datetime import datetime
+import mmap
+import db_pool
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class DataQualityChecker:
-    def __init__(self, data=None):
+    # (entity key, DB table, fields) - the first field is the primary key, the rest are FKs
+    TABLES_TO_CHECK = (
+        ('customers', 'Customer', ('CustomerID', 'NationalID')),
+        ('devices', 'Device', ('DeviceID', 'CustomerID')),
+        ('accounts', 'Account', ('AccountID', 'CustomerID')),
+        ('transactions', 'Transaction', ('TransactionID', 'FromAccountID', 'ToAccountID', 'DeviceID')),
+        ('auth_logs', 'AuthenticationLog', ('AuthID', 'CustomerID', 'DeviceID')),
+    )
+
+    SPECIAL_FORMAT_FIELDS = {
+        'NationalID': re.compile(r'^\d{12}$')
+    }
+
+    # Transaction FKs that both reference Account.AccountID
+    ACCOUNT_FK_FIELDS = frozenset({'FromAccountID', 'ToAccountID'})
+
+    def __init__(self, data=None, fail_fast=False):
         self.data = data or {}
+        # Stop at the first issue - only a pass/fail answer is needed
+        self.fail_fast = fail_fast
         self.quality_issues = []
         self.failed_records = {}
+        # id() của các record lỗi theo từng bảng, để lọc O(1) thay vì so sánh dict
+        self.failed_ids = {}
         
+    def mark_failed(self, entity_key, record):
+        """Add a record to the failed list of its entity, once"""
+        failed_ids = self.failed_ids.setdefault(entity_key, set())
+        if id(record) not in failed_ids:
+            failed_ids.add(id(record))
+            self.failed_records.setdefault(entity_key, []).append(record)
+
     def get_db_connection(self):
         try:
-            return psycopg2.connect(
-                host=os.getenv('DB_HOST', 'postgres_data'), port=os.getenv('DB_PORT', '5432'),
-                database=os.getenv('DB_NAME', 'mydata'), user=os.getenv('DB_USER', 'user'),
-                password=os.getenv('DB_PASSWORD', 'userpass'))
+            return db_pool.get_connection()
         except Exception as e:
             logger.warning(f"Database connection failed: {str(e)}")
             return None
@@ -35,18 +59,11 @@ class DataQualityChecker:
 
         self.quality_issues = []
         self.failed_records = {}
+        self.failed_ids = {}
 
-        tables_to_check = [
-            ('customers', 'Customer', ['CustomerID', 'NationalID']),
-            ('devices', 'Device', ['DeviceID', 'CustomerID']),
-            ('accounts', 'Account', ['AccountID', 'CustomerID']),
-            ('transactions', 'Transaction', ['TransactionID', 'FromAccountID', 'ToAccountID', 'DeviceID']),
-            ('auth_logs', 'AuthenticationLog', ['AuthID', 'CustomerID', 'DeviceID']),
-        ]
-
-        special_format_fields = {
-            'NationalID': r'^\d{12}$'
-        }
+        tables_to_check = self.TABLES_TO_CHECK
+        special_format_fields = self.SPECIAL_FORMAT_FIELDS
+        account_fk_fields = self.ACCOUNT_FK_FIELDS
 
         seen_values = {}
         field_to_entity = {}
@@ -54,22 +71,41 @@ class DataQualityChecker:
         fail_special_format = []
         pending_fks = {}
 
+        # Bind các method dùng trong vòng lặp record vào biến local
+        append_issue = self.quality_issues.append
+        mark_failed = self.mark_failed
+        fail_fast = self.fail_fast
+
         for entity_key, db_table, fields in tables_to_check:
+            if fail_fast and self.quality_issues:
+                break
             if entity_key not in self.data:
                 continue
 
             self.failed_records[entity_key] = []
+            self.failed_ids[entity_key] = set()
             records = self.data[entity_key]
+            id_field = fields[0]
+            seen_customer_ids = seen_national_ids = None
+            is_customers = entity_key == 'customers'
+            for field in fields:
+                field_to_entity[field] = db_table
+            # (FK field, field it references) - resolved once per table, not per record
+            fk_pairs = tuple(
+                (fk_field, 'AccountID' if fk_field in account_fk_fields else fk_field)
+                for fk_field in fields[1:]  # Skip the first field which is the primary key
+            )
 
             for i, record in enumerate(records):
+                if fail_fast and self.quality_issues:
+                    break
                 record_failed = False
 
                 for field in fields:
-                    field_to_entity[field] = db_table
                     value = record.get(field)
                     if not value or (isinstance(value, str) and not value.strip()):
-                        self.quality_issues.append(f"NULL/missing {field} in {entity_key}")
-                        self.failed_records[entity_key].append(record)
+                        append_issue(f"NULL/missing {field} in {entity_key}")
+                        mark_failed(entity_key, record)
                         record_failed = True
                         break
 
@@ -80,9 +116,9 @@ class DataQualityChecker:
 
                     # Kiểm tra định dạng đặc biệt
                     if field in special_format_fields:
-                        if not re.match(special_format_fields[field], value):
-                            self.quality_issues.append(f"Invalid {field} format: {value}")
-                            self.failed_records[entity_key].append(record)
+                        if not special_format_fields[field].match(value):
+                            append_issue(f"Invalid {field} format: {value}")
+                            mark_failed(entity_key, record)
                             record_failed = True
                             fail_special_format.append(record)
                             break
@@ -90,34 +126,30 @@ class DataQualityChecker:
                 if record_failed:
                     continue
 
-                if entity_key == 'customers':
-                    customer_id = record.get('CustomerID')
-                    national_id = record.get('NationalID')
+                if is_customers:
+                    # Both fields passed the checks above, so they are set and already stripped
+                    customer_id = record['CustomerID']
+                    national_id = record['NationalID']
 
-                    if 'CustomerID' not in seen_values:
-                        seen_values['CustomerID'] = {}
+                    if seen_customer_ids is None:
+                        seen_customer_ids = seen_values['CustomerID'] = {}
+                        seen_national_ids = seen_values['NationalID'] = {}
                         field_to_entity['CustomerID'] = entity_key
-                    if 'NationalID' not in seen_values:
-                        seen_values['NationalID'] = {}
-                    duplicate_found = False
-
-                    if customer_id is not None and customer_id in seen_values['CustomerID']:
-                        self.quality_issues.append(f"Duplicate CustomerID: {customer_id}")
-                        duplicate_found = True
-                    elif national_id is not None and national_id in seen_values['NationalID']:
-                        self.quality_issues.append(f"Duplicate NationalID: {national_id}")
-                        duplicate_found = True
 
-                    if duplicate_found:
-                        self.failed_records[entity_key].append(record)
-                        continue 
+                    if customer_id in seen_customer_ids:
+                        append_issue(f"Duplicate CustomerID: {customer_id}")
+                        mark_failed(entity_key, record)
+                        continue
+                    if national_id in seen_national_ids:
+                        append_issue(f"Duplicate NationalID: {national_id}")
+                        mark_failed(entity_key, record)
+                        continue
 
-                    seen_values['CustomerID'][customer_id] = i
-                    seen_values['NationalID'][national_id] = i
+                    seen_customer_ids[customer_id] = i
+                    seen_national_ids[national_id] = i
 
                 else:
                     # Only check primary key for duplicates
-                    id_field = fields[0]
                     id_value = record.get(id_field)
                     if id_value is not None:
                         if id_field not in seen_values:
@@ -125,157 +157,148 @@ class DataQualityChecker:
                             field_to_entity[id_field] = db_table
 
                         if id_value in seen_values[id_field]:
-                            self.quality_issues.append(f"Duplicate {id_field}: {id_value}")
-                            self.failed_records[entity_key].append(record)
+                            append_issue(f"Duplicate {id_field}: {id_value}")
+                            mark_failed(entity_key, record)
                             continue  # skip to next record
 
                 # === Foreign Key Check ===
                 
-                if entity_key != 'customers':
+                if not is_customers:
                     check = True
-                    fk_fields = fields[1:]  # Skip the first field which is the primary key
-                    for fk_field in fk_fields:
-                        actual_fk = 'AccountID' if fk_field in ['FromAccountID', 'ToAccountID'] else fk_field
+                    for fk_field, actual_fk in fk_pairs:
                         fk_value = record.get(fk_field)
 
                         if actual_fk in seen_values:
                             if fk_value not in seen_values[actual_fk]:
-                                if actual_fk not in pending_fks:
-                                    pending_fks[actual_fk] = {}
-
-                                if fk_value not in pending_fks[actual_fk]:
-                                    pending_fks[actual_fk][fk_value] = {}
-
-                                if entity_key not in pending_fks[actual_fk][fk_value]:
-                                    pending_fks[actual_fk][fk_value][entity_key] = i   
-
-                                self.quality_issues.append(
+                                # Mỗi giá trị FK chỉ được check DB một lần, dù nhiều record cùng tham chiếu
+                                pending_fks.setdefault(actual_fk, {}).setdefault(fk_value, {}).setdefault(entity_key, i)
+                                append_issue(
                                     f"Invalid foreign key {fk_field}: {fk_value} not found in {field_to_entity[actual_fk]}"
                                 )
-                                self.failed_records[entity_key].append(record)
+                                mark_failed(entity_key, record)
                                 check = False
                                 break
                         else:
-                            self.quality_issues.append(
+                            append_issue(
                                 f"Foreign key reference field {actual_fk} not yet loaded when processing {fk_field}"
                             )
-                            if actual_fk not in pending_fks:
-                                pending_fks[actual_fk] = {}
-
-                            if fk_value not in pending_fks[actual_fk]:
-                                pending_fks[actual_fk][fk_value] = {}
-
-                            if entity_key not in pending_fks[actual_fk][fk_value]:
-                                pending_fks[actual_fk][fk_value][entity_key] = i 
-                            self.failed_records[entity_key].append(record)
+                            pending_fks.setdefault(actual_fk, {}).setdefault(fk_value, {}).setdefault(entity_key, i)
+                            mark_failed(entity_key, record)
                             check = False
                             break
 
                     if check:
                         seen_values[id_field][id_value] = i
 
-        conn = self.get_db_connection()
+        if fail_fast and self.quality_issues:
+            logger.error(f"Stopped at first data quality issue: {self.quality_issues[0]}")
+            return False
+
+        # Gộp kiểm tra id đã tồn tại của mọi bảng vào một round trip:
+        # mỗi nhánh UNION ALL trả về (entity key, id, NationalID)
+        branches = []
+        params = []
+        id_fields = {}
+        for entity_key, db_table, fields in tables_to_check:
+            id_field = fields[0]
+            if entity_key == 'customers':
+                # Join với mảng id (unnest) thay vì IN list dài - planner có thể hash join.
+                # Bỏ qua mảng rỗng: unnest('{}') không xác định được kiểu và làm hỏng cả câu query
+                customer_parts = []
+                for field in ('CustomerID', 'NationalID'):
+                    if seen_values.get(field):
+                        customer_parts.append(
+                            f"SELECT '{entity_key}', t.CustomerID, t.NationalID FROM {db_table} t "
+                            f"JOIN unnest(%s) AS v(id) ON t.{field} = v.id"
+                        )
+                        params.append(list(seen_values[field]))
+                if not customer_parts:
+                    continue
+                branches.append(f"({' UNION '.join(customer_parts)})")
+            elif seen_values.get(id_field):
+                branches.append(
+                    f"SELECT '{entity_key}', t.{id_field}, NULL FROM {db_table} t JOIN unnest(%s) AS v(id) ON t.{id_field} = v.id"
+                )
+                params.append(list(seen_values[id_field]))
+            else:
+                continue
+            id_fields[entity_key] = (db_table, id_field)
+
+        # tập tất cả giá trị FK cần check, gộp mọi cột FK vào một round trip
+        fk_checks = []
+        for actual_fk, entities in pending_fks.items():
+            if not entities:
+                continue
+            table_name = field_to_entity.get(actual_fk)
+            if table_name is None:
+                # Bảng cha không có file input - các record đã bị đánh lỗi "not yet loaded" ở trên
+                logger.warning(f"Skipping DB FK check for {actual_fk}: its parent table was not loaded")
+                continue
+            fk_checks.append((actual_fk, table_name, list(entities)))
+
+        # Không có gì để đối chiếu với DB thì không cần mượn connection
+        conn = self.get_db_connection() if branches or fk_checks else None
         if conn:
             try:
                 cursor = conn.cursor()
-                for entity_key, db_table, fields in tables_to_check:
-                    id_field = fields[0]
-                    if entity_key == 'customers':
-                        if not seen_values.get('CustomerID') and not seen_values.get('NationalID'):
-                            continue
-                        id_customer = list(seen_values['CustomerID'].keys())
-                        id_NationalID = list(seen_values['NationalID'].keys())
-                        placeholders_CustomerID = ','.join(['%s'] * len(id_customer))
-                        placeholders_NationalID = ','.join(['%s'] * len(id_NationalID))
-                        try:
-                            cursor.execute(
-                                f"SELECT CustomerID, NationalID FROM {db_table} WHERE CustomerID IN ({placeholders_CustomerID}) OR NationalID IN ({placeholders_NationalID})",
-                                id_customer + id_NationalID
-                            )
-                            for row in cursor.fetchall():
-                                customer_id = row[0]
-                                national_id = row[1]
-                                if customer_id in seen_values['CustomerID'] or national_id in seen_values['NationalID']:
-                                    if customer_id in seen_values['CustomerID']:
-                                        idx = seen_values['CustomerID'][customer_id]
-                                    elif national_id in seen_values['NationalID']:
-                                        idx = seen_values['NationalID'][national_id]
-                                    record = self.data[entity_key][idx]
-                                    if customer_id in seen_values['CustomerID']:
-                                        self.quality_issues.append(f"CustomerID exists in database table {db_table}: {customer_id}")
-                                    else :
-                                        self.quality_issues.append(f"NationalID exists in database table {db_table}: {national_id}")
-                                    if record not in self.failed_records[entity_key]:
-                                        self.failed_records[entity_key].append(record)
-                        except Exception as e:
-                            logger.warning(f"DB check failed for {id_field} in {db_table}: {str(e)}")
-                            continue
-                        
-                        continue
-                    else:
-                        if not seen_values.get(id_field):
-                            continue
-                        ids_to_check = list(seen_values[id_field].keys())
-                        placeholders = ','.join(['%s'] * len(ids_to_check))
-                        
-                        try:
-                            cursor.execute(
-                                f"SELECT {id_field} FROM {db_table} WHERE {id_field} IN ({placeholders})",
-                                ids_to_check
-                            )
-                            existing_ids = set(row[0] for row in cursor.fetchall())
-                            
-                            for existing_id in existing_ids:
-                                if existing_id in seen_values[id_field]:
-                                    idx = seen_values[id_field][existing_id]
-                                    record = self.data[entity_key][idx]
-                                    self.quality_issues.append(f"{id_field} exists in database table {db_table}: {existing_id}")
-                                    if record not in self.failed_records[entity_key]:
-                                        self.failed_records[entity_key].append(record)
-                                        
-                        except Exception as e:
-                            logger.warning(f"DB check failed for {id_field} in {db_table}: {str(e)}")
-                            continue
-
-                for actual_fk, entities in pending_fks.items():
-                    # tập tất cả giá trị FK cần check
-                    fk_values = list(entities.keys())
-                    if not fk_values:
-                        continue
 
-                    placeholders = ','.join(['%s'] * len(fk_values))
-                    table_name = field_to_entity[actual_fk]
+                if branches:
+                    try:
+                        cursor.execute(" UNION ALL ".join(branches), params)
+                        for entity_key, existing_id, national_id in cursor.fetchall():
+                            db_table, id_field = id_fields[entity_key]
+                            if entity_key == 'customers':
+                                idx = seen_values['CustomerID'].get(existing_id)
+                                if idx is not None:
+                                    self.quality_issues.append(f"CustomerID exists in database table {db_table}: {existing_id}")
+                                else:
+                                    idx = seen_values['NationalID'].get(national_id)
+                                    if idx is None:
+                                        continue
+                                    self.quality_issues.append(f"NationalID exists in database table {db_table}: {national_id}")
+                            else:
+                                idx = seen_values[id_field].get(existing_id)
+                                if idx is None:
+                                    continue
+                                self.quality_issues.append(f"{id_field} exists in database table {db_table}: {existing_id}")
+                            # Một record có thể khớp nhiều dòng trong DB - mark_failed chỉ đánh dấu lỗi một lần
+                            self.mark_failed(entity_key, self.data[entity_key][idx])
+                    except Exception as e:
+                        logger.warning(f"DB check failed for {', '.join(id_fields)}: {str(e)}")
+
+                existing_fks = {actual_fk: set() for actual_fk, _, _ in fk_checks}
+                fk_check_failed = False
+                if fk_checks:
                     try:
                         cursor.execute(
-                            f"SELECT {actual_fk} FROM {table_name} WHERE {actual_fk} IN ({placeholders})",
-                            fk_values
+                            " UNION ALL ".join(
+                                f"SELECT '{actual_fk}', t.{actual_fk} FROM {table_name} t JOIN unnest(%s) AS v(id) ON t.{actual_fk} = v.id"
+                                for actual_fk, table_name, _ in fk_checks
+                            ),
+                            [fk_values for _, _, fk_values in fk_checks]
                         )
-                        existing = set(row[0] for row in cursor.fetchall())
-                        missing = set(fk_values) - existing
+                        for actual_fk, fk_value in cursor.fetchall():
+                            existing_fks[actual_fk].add(fk_value)
                     except Exception as e:
-                        logger.warning(f"DB FK check batch failed for {actual_fk}: {e}")
-                        missing = set()
+                        logger.warning(f"DB FK check batch failed for {', '.join(existing_fks)}: {e}")
+                        fk_check_failed = True
 
+                for actual_fk, table_name, fk_values in fk_checks:
+                    missing = set() if fk_check_failed else set(fk_values) - existing_fks[actual_fk]
 
+                    pending = pending_fks[actual_fk]
                     for fk_val in missing:
-                        if fk_val not in pending_fks[actual_fk]:
-                            continue
-                        for entity_key in pending_fks[actual_fk][fk_val]:
-                            idx = pending_fks[actual_fk][fk_val][entity_key]
-                            if entity_key not in self.failed_records:
-                                self.failed_records[entity_key] = []
-                            if self.data[entity_key][idx] not in self.failed_records[entity_key]:
-                                self.failed_records[entity_key].append(self.data[entity_key][idx])
-
+                        for entity_key, idx in pending[fk_val].items():
+                            self.mark_failed(entity_key, self.data[entity_key][idx])
                             self.quality_issues.append(
                                 f"Foreign key {actual_fk} not found in DB: {table_name}"
                             )
 
                 cursor.close()
-                conn.close()
+                db_pool.release_connection(conn)
             except Exception as e:
                 logger.warning(f"Database connection or query failed: {str(e)}")
-                conn.close()
+                db_pool.release_connection(conn)
 
         total_issues = len(self.quality_issues)
         if total_issues > 0:
@@ -290,77 +313,117 @@ class DataQualityChecker:
         clean_data = {}
         
         for data_type, records in self.data.items():
-            failed_records_for_type = self.failed_records.get(data_type, [])
-            clean_records = [record for record in records if record not in failed_records_for_type]
+            failed_ids = self.failed_ids.get(data_type, set())
+            clean_records = [record for record in records if id(record) not in failed_ids]
             clean_data[data_type] = clean_records
             logger.info(f"Clean {data_type}: {len(clean_records)}/{len(records)} records")
 
         return clean_data
 
-def load_and_cleanup_files(input_dir):
+def load_and_remove_file(file_path, remove=True):
+    """Load one JSON file and delete it, returning (table name, records)"""
+    filename = os.path.basename(file_path)
+    table_name = filename[:-len(".json")]
+    with open(file_path, 'rb') as f:
+        try:
+            # Parse straight from the mapped page cache instead of copying the file into a bytes object
+            if os.fstat(f.fileno()).st_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                    records = orjson.loads(view)
+            else:
+                # mmap rejects empty files - let orjson report them as invalid JSON
+                records = orjson.loads(b"")
+            logger.info(f"Loaded {len(records)} {table_name}")
+        except orjson.JSONDecodeError as e:
+            logger.error(f"Failed to load {filename}: {e}")
+            records = []
+    if not remove:
+        return table_name, records
+    try:
+        os.remove(file_path)
+        logger.info(f"Deleted {filename}")
+    except Exception as e:
+        logger.warning(f"Could not delete {file_path}: {e}")
+    return table_name, records
+
+def load_and_cleanup_files(input_dir, remove=True):
+    # Đọc tuần tự: vài file nhỏ trên tmpfs, mmap + orjson.loads giữ GIL nên thread không giúp gì
     data = {}
-    for filename in os.listdir(input_dir):
-        if filename.endswith(".json"):
-            file_path = os.path.join(input_dir, filename)
-            with open(file_path, 'r') as f:
-                try:
-                    data[filename.replace(".json", "")] = json.load(f)
-                    logger.info(f"Loaded {len(data[filename.replace('.json', '')])} {filename.replace('.json', '')}")
-                except json.JSONDecodeError as e:
-                    logger.error(f"Failed to load {filename}: {e}")
-                    data[filename.replace(".json", "")] = []
-            try:
-                os.remove(file_path)
-                logger.info(f"Deleted {filename}")
-            except Exception as e:
-                logger.warning(f"Could not delete {file_path}: {e}")
+    with os.scandir(input_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(".json") and entry.is_file():
+                table_name, records = load_and_remove_file(entry.path, remove)
+                data[table_name] = records
     return data
 
-def convert_datetime(obj):
-    if isinstance(obj, list):
-        return [convert_datetime(item) for item in obj]
-    elif isinstance(obj, dict):
-        return {key: convert_datetime(value) for key, value in obj.items()}
-    elif isinstance(obj, datetime):
-        return obj.isoformat()
-    return obj
-
-def save_clean_data(clean_data, output_dir, failed_data=None):
+def write_file(file_path, payload):
+    """Write a bytes payload with raw os.write calls instead of a buffered file object"""
+    fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        view = memoryview(payload)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+def save_clean_data(clean_data, output_dir, failed_data=None, pretty=False):
     os.makedirs(output_dir, exist_ok=True)
+    # Clean files are only read back by the next tasks, keep them compact unless asked
+    clean_option = orjson.OPT_INDENT_2 if pretty else 0
     for table_name, records in clean_data.items():
         if records:
-            with open(os.path.join(output_dir, f"{table_name}.json"), 'w') as f:
-                json.dump(convert_datetime(records), f, indent=2)
+            # orjson ghi datetime dạng ISO trực tiếp, không cần duyệt lại dữ liệu
+            write_file(os.path.join(output_dir, f"{table_name}.json"), orjson.dumps(records, option=clean_option))
             logger.info(f"Saved {len(records)} clean {table_name}")
     
     if failed_data and any(failed_data.values()):
-        with open(os.path.join(output_dir, "failed_records.json"), 'w') as f:
-            json.dump(failed_data, f, indent=2)
+        write_file(os.path.join(output_dir, "failed_records.json"),
+                   orjson.dumps(failed_data, option=orjson.OPT_INDENT_2))
         logger.info("Saved failed records log")
     
-def main():
-    parser = argparse.ArgumentParser(description="Data quality checker")
-    parser.add_argument('--input_dir', required=True, help='Input directory')
-    args = parser.parse_args()
+def run(input_dir, fail_fast=False):
+    """Check the JSON files in input_dir, replace them with clean data and return the issues found"""
+    if not os.path.exists(input_dir):
+        raise FileNotFoundError(f"Directory not found: {input_dir}")
 
-    if not os.path.exists(args.input_dir):
-        logger.error(f"Directory not found: {args.input_dir}")
-        sys.exit(1)
+    # fail_fast chỉ kiểm tra pass/fail: giữ nguyên file gốc, không ghi clean data
+    if fail_fast:
+        checker = DataQualityChecker(load_and_cleanup_files(input_dir, remove=False), fail_fast=True)
+        checker.check_all_quality()
+        return checker.quality_issues
 
     # Load data and run checks
-    data_dict = load_and_cleanup_files(args.input_dir)
+    data_dict = load_and_cleanup_files(input_dir)
     logger.info("Data loaded, original files deleted")
     
     checker = DataQualityChecker(data_dict)
-    success = checker.check_all_quality()
+    checker.check_all_quality()
     
     # Save results
     clean_data = checker.get_clean_data()
     failed_data = {"failed_records": checker.failed_records, "issues": checker.quality_issues}
-    save_clean_data(clean_data, args.input_dir, failed_data)
-    
-    if len(checker.quality_issues) > 0:
-        print(f"Quality check completed - {len(checker.quality_issues)} issues found")
+    save_clean_data(clean_data, input_dir, failed_data)
+    return checker.quality_issues
+
+def main():
+    parser = argparse.ArgumentParser(description="Data quality checker")
+    parser.add_argument('--input_dir', required=True, help='Input directory')
+    parser.add_argument('--fail_fast', action='store_true',
+                        help='Stop at the first issue and leave the input files untouched')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input_dir):
+        logger.error(f"Directory not found: {args.input_dir}")
+        sys.exit(1)
+
+    issues = run(args.input_dir, fail_fast=args.fail_fast)
+
+    if args.fail_fast:
+        print("Quality check failed" if issues else "Quality check passed")
+        sys.exit(1 if issues else 0)
+
+    if len(issues) > 0:
+        print(f"Quality check completed - {len(issues)} issues found")
         print("Clean data saved - check failed_records.json for details")
     else:
         print("Quality check passed - all data saved")
@@ -368,13 +431,4 @@ def main():
     sys.exit(0)
 
 if __name__ == "__main__":
-    main()
-
-
-
-
-
-
-
-
-
+    main()
\ No newline at end of file
@@ -1,22 +1,105 @@
-import psycopg2
+import io
 import logging
-import json
+import orjson
 import sys
 import os
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import db_pool
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def format_copy_value(value):
+    """Encode a value for COPY text format"""
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+@lru_cache(maxsize=None)
+def load_schema_sql():
+    """Read schema.sql once per process (schema changes need a worker restart)"""
+    schema_paths = ['/opt/airflow/sql/schema.sql', './sql/schema.sql']
+    for path in schema_paths:
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                return f.read()
+    # Raise instead of returning None - lru_cache does not cache exceptions, so a later call retries
+    raise FileNotFoundError(f"schema.sql not found in {', '.join(schema_paths)}")
+
+class CopyRecordStream(io.TextIOBase):
+    """Read-only file object that renders records as COPY text rows on demand"""
+
+    def __init__(self, records, columns):
+        self._rows = ('\t'.join(format_copy_value(record.get(col)) for col in columns) + '\n'
+                      for record in records)
+        self._pending = ''
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        chunks = [self._pending]
+        length = len(self._pending)
+        for row in self._rows:
+            chunks.append(row)
+            length += len(row)
+            if 0 <= size <= length:
+                break
+        data = ''.join(chunks)
+        if size < 0 or size >= len(data):
+            self._pending = ''
+            return data
+        self._pending = data[size:]
+        return data[:size]
+
 class DataUploader:
-    def __init__(self):
-        self.conn_params = {
-            'host': "postgres_data", 'port': 5432, 'database': "mydata", 
-            'user': "user", 'password': "userpass"
+    TABLE_CONFIGS = {
+        'customers': {
+            'columns': ('CustomerID', 'NationalID', 'Name', 'Address', 'Contact', 'Username', 'PasswordHash'),
+            'sql': """COPY Customer (CustomerID, NationalID, Name, Address, Contact, Username, PasswordHash)
+                     FROM STDIN"""
+        },
+        'devices': {
+            'columns': ('DeviceID', 'CustomerID', 'DeviceType', 'DeviceInfo', 'IsVerified', 'LastUsed'),
+            'sql': """COPY Device (DeviceID, CustomerID, DeviceType, DeviceInfo, IsVerified, LastUsed)
+                     FROM STDIN"""
+        },
+        'accounts': {
+            'columns': ('AccountID', 'CustomerID', 'AccountType', 'Balance', 'Currency', 'Status'),
+            'sql': """COPY Account (AccountID, CustomerID, AccountType, Balance, Currency, Status)
+                     FROM STDIN"""
+        },
+        'transactions': {
+            'columns': ('TransactionID', 'FromAccountID', 'ToAccountID', 'DeviceID', 'TxnType', 'Amount', 'Timestamp'),
+            'sql': """COPY Transaction (TransactionID, FromAccountID, ToAccountID, DeviceID, TxnType, Amount, Timestamp)
+                     FROM STDIN"""
+        },
+        'auth_logs': {
+            'columns': ('AuthID', 'CustomerID', 'DeviceID', 'AuthMethod', 'AuthStatus', 'Timestamp'),
+            'sql': """COPY AuthenticationLog (AuthID, CustomerID, DeviceID, AuthMethod, AuthStatus, Timestamp)
+                     FROM STDIN"""
+        },
+        'risk_alerts': {
+            'columns': ('CustomerID', 'TransactionID', 'alert_type', 'alert_level', 'description', 'timestamp'),
+            'sql': """COPY RiskAlerts (CustomerID, TransactionID, AlertType, AlertLevel, Description, CreatedAt)
+                     FROM STDIN"""
         }
+    }
+
+    # Tables grouped by foreign-key depth; tables in the same group are loaded in parallel
+    UPLOAD_LEVELS = (
+        ('customers',),
+        ('devices', 'accounts'),
+        ('transactions', 'auth_logs'),
+        ('risk_alerts',),
+    )
+
     def get_connection(self):
         try:
-            conn = psycopg2.connect(**self.conn_params)
+            conn = db_pool.get_connection()
             logger.info("Database connected")
             return conn
         except Exception as e:
@@ -26,28 +109,22 @@ class DataUploader:
     def create_tables_if_needed(self, conn):
         cursor = conn.cursor()
         try:
-            schema_paths = ['/opt/airflow/sql/schema.sql', './sql/schema.sql']
-            for path in schema_paths:
-                if os.path.exists(path):
-                    with open(path, 'r') as f:
-                        cursor.execute(f.read())
-                    conn.commit()
-                    logger.info("Tables created/verified")
-                    break
+            schema_sql = load_schema_sql()
+            if schema_sql:
+                cursor.execute(schema_sql)
+                conn.commit()
+                logger.info("Tables created/verified")
         except Exception as e:
             logger.warning(f"Error creating tables: {str(e)}")
         finally:
             cursor.close()
-    def upload_data(self, conn, table_name, data, columns, insert_sql):
+    def upload_data(self, conn, table_name, data, columns, copy_sql):
         if not data:
             return 0
         cursor = conn.cursor()
-        count = 0
         try:
-            for record in data:
-                values = [record.get(col) for col in columns]
-                cursor.execute(insert_sql, values)
-                count += cursor.rowcount
+            cursor.copy_expert(copy_sql, CopyRecordStream(data, columns))
+            count = cursor.rowcount
             conn.commit()
             logger.info(f"Uploaded {count} {table_name}")
             return count
@@ -58,65 +135,50 @@ class DataUploader:
         finally:
             cursor.close()
 
-    def upload_all_data(self, conn, data):
-        configs = {
-            'customers': {
-                'columns': ['CustomerID', 'NationalID', 'Name', 'Address', 'Contact', 'Username', 'PasswordHash'],
-                'sql': """INSERT INTO Customer (CustomerID, NationalID, Name, Address, Contact, Username, PasswordHash)
-                         VALUES (%s, %s, %s, %s, %s, %s, %s)"""
-            },
-            'devices': {
-                'columns': ['DeviceID', 'CustomerID', 'DeviceType', 'DeviceInfo', 'IsVerified', 'LastUsed'],
-                'sql': """INSERT INTO Device (DeviceID, CustomerID, DeviceType, DeviceInfo, IsVerified, LastUsed)
-                         VALUES (%s, %s, %s, %s, %s, %s)"""
-            },
-            'accounts': {
-                'columns': ['AccountID', 'CustomerID', 'AccountType', 'Balance', 'Currency', 'Status'],
-                'sql': """INSERT INTO Account (AccountID, CustomerID, AccountType, Balance, Currency, Status)
-                         VALUES (%s, %s, %s, %s, %s, %s)"""
-            },
-            'transactions': {
-                'columns': ['TransactionID', 'FromAccountID', 'ToAccountID', 'DeviceID', 'TxnType', 'Amount', 'Timestamp'],
-                'sql': """INSERT INTO Transaction (TransactionID, FromAccountID, ToAccountID, DeviceID, TxnType, Amount, Timestamp)
-                         VALUES (%s, %s, %s, %s, %s, %s, %s)"""
-            },
-            'auth_logs': {
-                'columns': ['AuthID', 'CustomerID', 'DeviceID', 'AuthMethod', 'AuthStatus', 'Timestamp'],
-                'sql': """INSERT INTO AuthenticationLog (AuthID, CustomerID, DeviceID, AuthMethod, AuthStatus, Timestamp)
-                         VALUES (%s, %s, %s, %s, %s, %s)"""
-            },
-           'risk_alerts': {
-               'columns': ['CustomerID', 'TransactionID', 'alert_type', 'alert_level', 'description', 'timestamp'],
-               'sql': """INSERT INTO RiskAlerts (CustomerID, TransactionID, AlertType, AlertLevel, Description, CreatedAt)
-                        VALUES (%s, %s, %s, %s, %s, %s)"""
-           }
-        }
-        
+    def upload_table(self, table_name, data, data_dir=None):
+        """Upload one table on its own pooled connection"""
+        config = self.TABLE_CONFIGS[table_name]
+        conn = self.get_connection()
+        try:
+            count = self.upload_data(conn, table_name, data, config['columns'], config['sql'])
+        finally:
+            db_pool.release_connection(conn)
+        if data_dir:
+            # COPY đã commit - xóa file ngay để lần retry không COPY lại bảng này (trùng khóa chính)
+            remove_json_file(os.path.join(data_dir, f"{table_name}.json"))
+        return count
+
+    def upload_all_data(self, data, data_dir=None):
         total = 0
-        for table_name, config in configs.items():
-            if table_name in data:
-                total += self.upload_data(conn, table_name, data[table_name], 
-                                        config['columns'], config['sql'])
+        for level in self.UPLOAD_LEVELS:
+            tables = [table_name for table_name in level if data.get(table_name)]
+            if not tables:
+                continue
+            if len(tables) == 1:
+                total += self.upload_table(tables[0], data[tables[0]], data_dir)
+                continue
+            with ThreadPoolExecutor(max_workers=len(tables)) as executor:
+                futures = [executor.submit(self.upload_table, table_name, data[table_name], data_dir)
+                           for table_name in tables]
+                total += sum(future.result() for future in futures)
         return total
 
+JSON_FILES = ('customers.json', 'devices.json', 'accounts.json', 'transactions.json', 'auth_logs.json', 'risk_alerts.json')
+
 def load_json_data(data_dir):
     data = {}
     if not os.path.exists(data_dir):
         logger.error(f"Directory not found: {data_dir}")
         return data
     
-    json_files = ['customers.json', 'devices.json', 'accounts.json', 'transactions.json', 'auth_logs.json', 'risk_alerts.json']
-    for filename in json_files:
+    for filename in JSON_FILES:
         filepath = os.path.join(data_dir, filename)
         table_name = filename.replace('.json', '')
         try:
             if os.path.exists(filepath):
-                with open(filepath, 'r') as f:
-                    data[table_name] = json.load(f)
+                with open(filepath, 'rb') as f:
+                    data[table_name] = orjson.loads(f.read())
                 logger.info(f"Loaded {len(data[table_name])} {table_name}")
-
-                os.remove(filepath)
-                logger.info(f"Deleted file: {filepath}")
             else:
                 data[table_name] = []
         except Exception as e:
@@ -124,32 +186,62 @@ def load_json_data(data_dir):
             data[table_name] = []
     return data
 
+def remove_json_file(filepath):
+    """Delete one loaded JSON file, if it is still there"""
+    try:
+        os.remove(filepath)
+        logger.info(f"Deleted file: {filepath}")
+    except FileNotFoundError:
+        pass
+
+def remove_json_files(data_dir):
+    """Delete the loaded JSON files once their data is safely in the database"""
+    for filename in JSON_FILES:
+        remove_json_file(os.path.join(data_dir, filename))
+
+def init_schema():
+    """Create the pipeline tables if they do not exist yet"""
+    uploader = DataUploader()
+    conn = uploader.get_connection()
+    try:
+        uploader.create_tables_if_needed(conn)
+    finally:
+        db_pool.release_connection(conn)
+
+def run(data_dir, create_tables=True):
+    """Upload the JSON files in data_dir and return the number of records inserted"""
+    data = load_json_data(data_dir)
+    if not any(data.values()):
+        logger.info("No data found to upload")
+        remove_json_files(data_dir)
+        return 0
+    
+    if create_tables:
+        init_schema()
+
+    uploader = DataUploader()
+    # File của từng bảng bị xóa ngay khi bảng đó commit, nên retry chỉ upload các bảng còn lại
+    total_uploaded = uploader.upload_all_data(data, data_dir)
+    remove_json_files(data_dir)
+
+    if total_uploaded > 0:
+        logger.info(f"Upload completed - {total_uploaded} total records")
+    else:
+        logger.warning("No records were uploaded")
+    return total_uploaded
+
 def main():
     parser = argparse.ArgumentParser(description="Upload clean JSON data to database")
     parser.add_argument('--dir', required=True, help='Directory containing JSON files')
     args = parser.parse_args()
     
     try:
-        data = load_json_data(args.dir)
-        if not any(data.values()):
-            logger.info("No data found to upload")
-            return
+        total_uploaded = run(args.dir)
         
-        uploader = DataUploader()
-        conn = uploader.get_connection()
-        
-        try:
-            uploader.create_tables_if_needed(conn)
-            total_uploaded = uploader.upload_all_data(conn, data)
-            
-            if total_uploaded > 0:
-                logger.info(f"Upload completed - {total_uploaded} total records")
-                print(f"Upload successful - {total_uploaded} records uploaded")
-            else:
-                logger.warning("No records were uploaded")
-                print("Upload completed but no records were inserted")
-        finally:
-            conn.close()
+        if total_uploaded > 0:
+            print(f"Upload successful - {total_uploaded} records uploaded")
+        else:
+            print("Upload completed but no records were inserted")
             
     except Exception as e:
         logger.error(f"Upload failed: {str(e)}")
@@ -157,4 +249,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
+    main()
\ No newline at end of file
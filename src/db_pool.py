@@ -0,0 +1,56 @@
+import os
+import logging
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from psycopg2 import pool
+
+logger = logging.getLogger(__name__)
+
+POOL_MIN_CONNECTIONS = 1
+POOL_MAX_CONNECTIONS = 10
+
+_pool = None
+# Upload workers can ask for the pool at the same time - only one may create it
+_pool_lock = threading.Lock()
+
+@lru_cache(maxsize=1)
+def get_connection_params():
+    """Read DB settings from the environment once per process"""
+    return {
+        'host': os.getenv('DB_HOST', 'postgres_data'), 'port': os.getenv('DB_PORT', '5432'),
+        'database': os.getenv('DB_NAME', 'mydata'), 'user': os.getenv('DB_USER', 'user'),
+        'password': os.getenv('DB_PASSWORD', 'userpass')
+    }
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pool.ThreadedConnectionPool(
+                    POOL_MIN_CONNECTIONS, POOL_MAX_CONNECTIONS, **get_connection_params())
+                logger.info("Database connection pool created")
+    return _pool
+
+def get_connection():
+    """Borrow a connection from the pool, replacing it if it was closed"""
+    db_pool = get_pool()
+    conn = db_pool.getconn()
+    if conn.closed:
+        db_pool.putconn(conn, close=True)
+        conn = db_pool.getconn()
+    return conn
+
+def release_connection(conn):
+    """Return a connection to the pool, rolling back any open transaction"""
+    get_pool().putconn(conn)
+
+@contextmanager
+def connection():
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        release_connection(conn)
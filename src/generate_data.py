@@ -1,41 +1,39 @@
 import random
 import string
 import os
-import json
+import orjson
 import argparse
 import logging
-from datetime import datetime
-from faker import Faker
+from functools import lru_cache
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
-fake = Faker()
 
-def convert_datetimes(obj):
-    if isinstance(obj, list):
-        return [convert_datetimes(item) for item in obj]
-    elif isinstance(obj, dict):
-        return {key: convert_datetimes(value) for key, value in obj.items()}
-    elif isinstance(obj, datetime):
-        return obj.isoformat()
-    return obj
+@lru_cache(maxsize=1)
+def get_faker():
+    """Create the shared Faker instance on first use (importing faker is slow)"""
+    from faker import Faker
+    return Faker()
 
 class BankDataGenerator:
     def generate_customers(self, n=10):
         logger.info(f"Generating {n} customers...")
+        fake = get_faker()
         customers = []
         used_ids = set()
+        used_id_list = []  # same ids as a list, so duplicates can be picked in O(1)
         
         for i in range(n):
             # Sometimes generate duplicate IDs (20% chance)
             if random.random() < 0.2 and used_ids:
-                customer_id = random.choice(list(used_ids))
+                customer_id = random.choice(used_id_list)
             else:
                 # Generate random ID between 1000 and 999999
                 customer_id = random.randint(1000, 999999)
                 # Ensure uniqueness for new IDs
                 while customer_id in used_ids:
                     customer_id = random.randint(1000, 999999)
+                used_id_list.append(customer_id)
             
             used_ids.add(customer_id)
             
@@ -53,8 +51,10 @@ class BankDataGenerator:
 
     def generate_devices(self, customers_data):
         logger.info("Generating devices...")
+        fake = get_faker()
         devices = []
         used_ids = set()
+        used_id_list = []  # same ids as a list, so duplicates can be picked in O(1)
         
         for customer in customers_data:
             # Each customer has 1-3 devices
@@ -62,12 +62,13 @@ class BankDataGenerator:
             for _ in range(num_devices):
                 # Sometimes generate duplicate IDs (15% chance)
                 if random.random() < 0.15 and used_ids:
-                    device_id = random.choice(list(used_ids))
+                    device_id = random.choice(used_id_list)
                 else:
                     # Generate unique device ID between 10000 and 9999999
                     device_id = random.randint(10000, 9999999)
                     while device_id in used_ids:
                         device_id = random.randint(10000, 9999999)
+                    used_id_list.append(device_id)
                 
                 used_ids.add(device_id)
                 
@@ -86,17 +87,19 @@ class BankDataGenerator:
         logger.info("Generating accounts...")
         accounts = []
         used_ids = set()
+        used_id_list = []  # same ids as a list, so duplicates can be picked in O(1)
         
         for customer in customers_data:
             for _ in range(random.randint(1, 3)):
                 # Sometimes generate duplicate IDs (10% chance)
                 if random.random() < 0.1 and used_ids:
-                    account_id = random.choice(list(used_ids))
+                    account_id = random.choice(used_id_list)
                 else:
                     # Generate random ID between 100000 and 99999999
                     account_id = random.randint(100000, 99999999)
                     while account_id in used_ids:
                         account_id = random.randint(100000, 99999999)
+                    used_id_list.append(account_id)
                 
                 used_ids.add(account_id)
                 
@@ -113,8 +116,10 @@ class BankDataGenerator:
 
     def generate_transactions(self, accounts_data, device_data):
         logger.info("Generating transactions...")
-        if len(accounts_data) < 2:
+        # Cần ít nhất 2 AccountID khác nhau, nếu không vòng bốc to_acc bên dưới không bao giờ dừng
+        if len({acc['AccountID'] for acc in accounts_data}) < 2:
             return []
+        fake = get_faker()
         
         # Create customer to devices mapping for efficient lookup
         customer_devices = {}
@@ -126,21 +131,26 @@ class BankDataGenerator:
         
         transactions = []
         used_ids = set()
+        used_id_list = []  # same ids as a list, so duplicates can be picked in O(1)
         
         for i in range(50):
             # Sometimes generate duplicate IDs (25% chance)
             if random.random() < 0.25 and used_ids:
-                transaction_id = random.choice(list(used_ids))
+                transaction_id = random.choice(used_id_list)
             else:
                 # Generate random ID between 1000000 and 999999999
                 transaction_id = random.randint(1000000, 999999999)
                 while transaction_id in used_ids:
                     transaction_id = random.randint(1000000, 999999999)
+                used_id_list.append(transaction_id)
             
             used_ids.add(transaction_id)
             
             from_acc = random.choice(accounts_data)
-            to_acc = random.choice([acc for acc in accounts_data if acc['AccountID'] != from_acc['AccountID']])
+            # Bốc lại thay vì lọc cả danh sách account cho mỗi giao dịch
+            to_acc = random.choice(accounts_data)
+            while to_acc['AccountID'] == from_acc['AccountID']:
+                to_acc = random.choice(accounts_data)
             
             # Ensure device belongs to the same customer as the from_account
             from_customer_id = from_acc['CustomerID']
@@ -166,6 +176,7 @@ class BankDataGenerator:
 
     def generate_auth_logs(self, customers_data, devices_data):
         logger.info("Generating auth logs...")
+        fake = get_faker()
         if not customers_data or not devices_data:
             return []
         
@@ -179,16 +190,18 @@ class BankDataGenerator:
         
         auth_logs = []
         used_ids = set()
+        used_id_list = []  # same ids as a list, so duplicates can be picked in O(1)
         
         for i in range(30):
             # Sometimes generate duplicate IDs (30% chance)
             if random.random() < 0.3 and used_ids:
-                auth_id = random.choice(list(used_ids))
+                auth_id = random.choice(used_id_list)
             else:
                 # Generate random ID between 10000 and 9999999
                 auth_id = random.randint(10000, 9999999)
                 while auth_id in used_ids:
                     auth_id = random.randint(10000, 9999999)
+                used_id_list.append(auth_id)
             
             used_ids.add(auth_id)
             
@@ -235,33 +248,38 @@ class BankDataGenerator:
         logger.info(f"Data generation completed - {total_records} total records")
         return data
 
+def run(output_dir, customer_count=10):
+    """Generate banking data into output_dir and return record counts per table"""
+    os.makedirs(output_dir, exist_ok=True)
+    get_faker().unique.clear()
+
+    generator = BankDataGenerator()
+    data = generator.generate_all_data(customer_count)
+
+    if not data:
+        raise RuntimeError("Data generation failed")
+
+    # Save to JSON files
+    for key, records in data.items():
+        filepath = os.path.join(output_dir, f"{key}.json")
+        # orjson ghi datetime dạng ISO trực tiếp
+        with open(filepath, 'wb') as f:
+            f.write(orjson.dumps(records))
+        logger.info(f"Saved {len(records)} {key} to {filepath}")
+
+    # Summary
+    total = sum(len(v) for v in data.values())
+    logger.info(f"Summary: {total} records saved to {output_dir}")
+    return {key: len(records) for key, records in data.items()}
+
 def main():
     parser = argparse.ArgumentParser(description="Generate synthetic banking data")
     parser.add_argument('--output_dir', required=True, help='Directory to save generated data')
     args = parser.parse_args()
     
     try:
-        os.makedirs(args.output_dir, exist_ok=True)
         customer_count = int(os.getenv('CUSTOMER_COUNT', '10'))
-        
-        generator = BankDataGenerator()
-        data = generator.generate_all_data(customer_count)
-        
-        if not data:
-            logger.error("Data generation failed")
-            return 1
-        
-        # Save to JSON files
-        for key, records in data.items():
-            filepath = os.path.join(args.output_dir, f"{key}.json")
-            with open(filepath, 'w') as f:
-                json.dump(convert_datetimes(records), f, indent=2)
-            logger.info(f"Saved {len(records)} {key} to {filepath}")
-        
-        # Summary
-        total = sum(len(v) for v in data.values())
-        logger.info(f"Summary: {total} records saved to {args.output_dir}")
-        
+        run(args.output_dir, customer_count)
     except Exception as e:
         logger.error(f"Error: {str(e)}")
         return 1
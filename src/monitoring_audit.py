@@ -1,10 +1,10 @@
 #!/usr/bin/env python3
-import json
+import orjson
 import argparse
 import os
 import logging
-import psycopg2
 from datetime import datetime
+import db_pool
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -17,10 +17,7 @@ class BankingMonitor:
     
     def get_db_connection(self):
         try:
-            return psycopg2.connect(
-                host=os.getenv('DB_HOST', 'postgres_data'), port=os.getenv('DB_PORT', '5432'),
-                database=os.getenv('DB_NAME', 'mydata'), user=os.getenv('DB_USER', 'user'),
-                password=os.getenv('DB_PASSWORD', 'userpass'))
+            return db_pool.get_connection()
         except Exception as e:
             return None
         
@@ -28,8 +25,8 @@ class BankingMonitor:
         for table in ['customers', 'accounts', 'transactions', 'auth_logs', 'devices']:
             path = os.path.join(self.data_dir, f'{table}.json')
             try:
-                with open(path, 'r') as f:
-                    self.data[table] = json.load(f)
+                with open(path, 'rb') as f:
+                    self.data[table] = orjson.loads(f.read())
             except FileNotFoundError:
                 self.data[table] = []
 
@@ -67,9 +64,39 @@ class BankingMonitor:
         if not conn:
             logger.error("Failed to connect to database")
             return violations
+
+        # Lấy trạng thái thiết bị và tổng giao dịch theo ngày từ DB một lần cho tất cả giao dịch
+        transactions = self.data.get('transactions', [])
+        verified_devices = {}
+        db_daily_totals = {}
+        # Chỉ cần connection cho 2 truy vấn tra cứu - trả về pool kể cả khi lỗi
         cursor = conn.cursor()
+        try:
+            if transactions:
+                device_ids = list({txn.get('DeviceID') for txn in transactions})
+                from_accounts = list({txn.get('FromAccountID') for txn in transactions})
+                try:
+                    cursor.execute(
+                        "SELECT DeviceID, IsVerified FROM Device WHERE DeviceID = ANY(%s)", (device_ids,))
+                    verified_devices = {row[0]: row[1] or False for row in cursor.fetchall()}
+                except Exception as e:
+                    conn.rollback()
+                    logger.warning(f"Device verification lookup failed: {str(e)}")
+                try:
+                    cursor.execute(
+                        """SELECT FromAccountID, DATE(Timestamp), SUM(Amount) FROM Transaction
+                           WHERE FromAccountID = ANY(%s) GROUP BY FromAccountID, DATE(Timestamp)""",
+                        (from_accounts,))
+                    db_daily_totals = {(row[0], row[1].isoformat()): float(row[2] or 0)
+                                       for row in cursor.fetchall() if row[1]}
+                except Exception as e:
+                    conn.rollback()
+                    logger.warning(f"Daily totals lookup failed: {str(e)}")
+        finally:
+            cursor.close()
+            db_pool.release_connection(conn)
 
-        for txn in self.data.get('transactions', []):
+        for txn in transactions:
             CustomerID = account_map.get(txn.get('FromAccountID'))
             if not CustomerID:
                 continue
@@ -90,13 +117,7 @@ class BankingMonitor:
                              txn.get('TransactionID'))
             
             # Unverified device
-            try:
-                cursor.execute(
-                    "SELECT IsVerified FROM Device WHERE DeviceID = %s", (txn.get('DeviceID'),))
-                is_verified = cursor.fetchone()[0] or False
-            except Exception as e:
-                is_verified = False
-                
+            is_verified = verified_devices.get(txn.get('DeviceID'), False)
 
             if not device_map.get(txn.get('DeviceID'), False) and not is_verified:
                 violations += 1
@@ -106,14 +127,7 @@ class BankingMonitor:
                              txn.get('TransactionID'))
             
             txn_date = timestamp[:10] if timestamp else ''
-            try: 
-                cursor.execute(
-                    "SELECT SUM(Amount) FROM Transaction WHERE FromAccountID = %s AND DATE(Timestamp) = %s",
-                    (txn.get('FromAccountID'), txn_date))
-                total = cursor.fetchone()[0] or 0
-            except Exception as e:
-                total = 0
-
+            total = db_daily_totals.get((txn.get('FromAccountID'), txn_date), 0)
 
             daily_totals[CustomerID] = daily_totals.get(CustomerID, 0) + amount
             tmp = daily_totals.get(CustomerID, 0) + amount
@@ -139,8 +153,8 @@ class BankingMonitor:
         logger.info(f"Total risk violations found: {risk_violations}")
         # Save alerts
         alerts_file = os.path.join(self.data_dir, 'risk_alerts.json')
-        with open(alerts_file, 'w') as f:
-            json.dump(self.alerts, f, indent=2)
+        with open(alerts_file, 'wb') as f:
+            f.write(orjson.dumps(self.alerts))
 
 def main():
     parser = argparse.ArgumentParser()
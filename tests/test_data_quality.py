@@ -0,0 +1,67 @@
+import os
+import sys
+
+import orjson
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import data_quality
+
+
+@pytest.fixture
+def no_db(monkeypatch):
+    """Run the checks without a database - only the in-file checks apply"""
+    monkeypatch.setattr(data_quality.DataQualityChecker, 'get_db_connection', lambda self: None)
+
+
+def write_input(input_dir, data):
+    for table_name, records in data.items():
+        (input_dir / f"{table_name}.json").write_bytes(orjson.dumps(records))
+
+
+INVALID_INPUT = {
+    'customers': [
+        {'CustomerID': 1, 'NationalID': '123'},           # bad NationalID format
+        {'CustomerID': 2, 'NationalID': '123456789012'},
+        {'CustomerID': 2, 'NationalID': '210987654321'},  # duplicate CustomerID
+    ],
+    'devices': [{'DeviceID': 10, 'CustomerID': 99}],      # unknown customer
+}
+
+
+def test_missing_parent_table_fails_without_crashing(no_db):
+    # transactions arrive without accounts.json, so AccountID is never loaded
+    checker = data_quality.DataQualityChecker({
+        'customers': [{'CustomerID': 1, 'NationalID': '123456789012'}],
+        'devices': [{'DeviceID': 2, 'CustomerID': 1}],
+        'transactions': [{'TransactionID': 3, 'FromAccountID': 4, 'ToAccountID': 5, 'DeviceID': 2}],
+    })
+
+    assert checker.check_all_quality() is False
+    assert any('AccountID not yet loaded' in issue for issue in checker.quality_issues)
+    assert checker.failed_records['transactions'] == checker.data['transactions']
+
+
+def test_fail_fast_stops_at_first_invalid_record(no_db, tmp_path):
+    write_input(tmp_path, INVALID_INPUT)
+
+    issues = data_quality.run(str(tmp_path), fail_fast=True)
+
+    assert issues == ['Invalid NationalID format: 123']
+    # Input files are left untouched and no clean data is written
+    assert sorted(os.listdir(tmp_path)) == ['customers.json', 'devices.json']
+    assert orjson.loads((tmp_path / 'customers.json').read_bytes()) == INVALID_INPUT['customers']
+
+
+def test_without_fail_fast_collects_all_issues(no_db, tmp_path):
+    write_input(tmp_path, INVALID_INPUT)
+
+    issues = data_quality.run(str(tmp_path), fail_fast=False)
+
+    assert len(issues) == 3
+    assert issues[:2] == ['Invalid NationalID format: 123', 'Duplicate CustomerID: 2']
+    assert issues[2].startswith('Invalid foreign key CustomerID: 99 not found in')
+    assert orjson.loads((tmp_path / 'customers.json').read_bytes()) == [INVALID_INPUT['customers'][1]]
+    failed = orjson.loads((tmp_path / 'failed_records.json').read_bytes())
+    assert failed['issues'] == issues
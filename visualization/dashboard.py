@@ -12,16 +12,27 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource
+def _connect():
+    """Open the read-only connection shared by all dashboard sessions"""
+    conn = psycopg2.connect(
+        host=os.getenv('DB_HOST', 'postgres_data'),
+        port=os.getenv('DB_PORT', '5432'),
+        database=os.getenv('DB_NAME', 'mydata'),
+        user=os.getenv('DB_USER', 'user'),
+        password=os.getenv('DB_PASSWORD', 'userpass')
+    )
+    conn.set_session(readonly=True, autocommit=True)
+    return conn
+
 def get_db_connection():
     """Get database connection"""
     try:
-        conn = psycopg2.connect(
-            host=os.getenv('DB_HOST', 'postgres_data'),
-            port=os.getenv('DB_PORT', '5432'),
-            database=os.getenv('DB_NAME', 'mydata'),
-            user=os.getenv('DB_USER', 'user'),
-            password=os.getenv('DB_PASSWORD', 'userpass')
-        )
+        conn = _connect()
+        if conn.closed:
+            # Kết nối bị đóng (DB restart) - tạo lại
+            _connect.clear()
+            conn = _connect()
         return conn
     except Exception as e:
         st.error(f"Database connection failed: {str(e)}")
@@ -42,8 +53,6 @@ def load_data():
         transactions = pd.read_sql("SELECT * FROM Transaction", conn)
         auth_logs = pd.read_sql("SELECT * FROM AuthenticationLog", conn)
         risk_alerts = pd.read_sql("SELECT * FROM RiskAlerts", conn)
-
-        conn.close()
         
         return {
             'customers': customers,
@@ -55,7 +64,6 @@ def load_data():
         }
     except Exception as e:
         st.error(f"Error loading data: {str(e)}")
-        conn.close()
         return None
 
 def create_overview_metrics(data):
@@ -291,8 +299,8 @@ def main():
         st.rerun()
     
     st.sidebar.markdown("### Data Overview")
-    for table_name, df in data.items():
-        st.sidebar.write(f"**{table_name.title()}**: {len(df)} records")
+    st.sidebar.markdown("\n\n".join(
+        f"**{table_name.title()}**: {len(df)} records" for table_name, df in data.items()))
     
     # Main dashboard
     create_overview_metrics(data)